@@ -1,13 +1,27 @@
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-from .utils import command_exists, get_asset_names, get_release_map, run_command
+from .utils import (
+    command_exists,
+    fetch_release_map_and_assets,
+    get_release_assets_json,
+    get_repo_name_from_gh,
+    read_file_names,
+    run_command,
+)
 
-def delete_asset(release, asset_name, repo=None):
+MAX_DELETE_WORKERS = 16
+
+def get_asset_ids(release, repo=None, release_id=None):
+    """Get a mapping of asset name to asset id for a given release."""
+    return {asset['name']: asset['id'] for asset in get_release_assets_json(release, repo=repo, release_id=release_id)}
+
+def delete_asset(release, asset_name, asset_id, repo=None):
     """Delete an asset from a release."""
     print(f"Deleting asset '{asset_name}' from release '{release}'")
-    run_command(['gh', 'release', 'delete-asset', release, asset_name, '-y'], repo=repo)
+    run_command(['gh', 'api', '-X', 'DELETE', f"repos/{get_repo_name_from_gh(repo)}/releases/assets/{asset_id}"])
 
 def cli():
     """Main function to delete files from a release."""
@@ -25,24 +39,23 @@ def cli():
     if not args.file_list and not args.files:
         parser.error("No files to delete. Please provide a file list with --file-list or specify file names as arguments.")
 
-    files_to_delete = set()
-    if args.file_list:
-        if args.file_list.exists():
-            with open(args.file_list, 'r') as f:
-                files_to_delete.update(line.strip() for line in f if line.strip())
-        else:
-            print(f"Error: File list '{args.file_list}' not found.", file=sys.stderr)
-            return 1
-            
-    if args.files:
-        files_to_delete.update(args.files)
+    if args.file_list and not args.file_list.exists():
+        print(f"Error: File list '{args.file_list}' not found.", file=sys.stderr)
+        return 1
+
+    files_to_delete = read_file_names(args.file_list, args.files)
 
     if not files_to_delete:
         print("No files to delete.")
         return 0
 
-    print("Getting release list")
-    release_map = get_release_map(args.release, repo=args.repo)
+    if len(files_to_delete) <= 50:
+        print(f"Files to delete: {sorted(files_to_delete)}")
+    else:
+        print(f"Files to delete: {len(files_to_delete)} files")
+
+    print("Getting release list and assets")
+    release_map, release_to_assets, _ = fetch_release_map_and_assets(args.release, repo=args.repo, fetch=get_asset_ids)
     
     if not release_map:
         print("No releases found to process.", file=sys.stderr)
@@ -51,32 +64,47 @@ def cli():
     releases_to_process = list(release_map.values())
 
     print(f"Will process releases: {releases_to_process}")
-    print(f"Files to delete: {sorted(list(files_to_delete))}")
 
-    deleted_assets = set()
-    for release in releases_to_process:
+    tasks = []
+    for release, asset_ids in release_to_assets.items():
         print(f"Processing release: {release}")
-        assets = get_asset_names(release, repo=args.repo)
-        
-        assets_set = set(assets)
-        assets_to_delete_from_release = files_to_delete.intersection(assets_set)
+        # the keys view intersects without building another set, iterating the smaller side
+        assets_to_delete_from_release = asset_ids.keys() & files_to_delete
 
         if not assets_to_delete_from_release:
             print(f"No matching files to delete in release '{release}'.")
             continue
 
-        for asset in sorted(list(assets_to_delete_from_release)):
-            if delete_asset(release, asset, repo=args.repo):
-                deleted_assets.add(asset)
+        for asset in sorted(assets_to_delete_from_release):
+            tasks.append((release, asset, asset_ids[asset]))
+
+    deleted_assets = set()
+    failed_assets = set()
+    if tasks:
+        with ThreadPoolExecutor(max_workers=min(len(tasks), MAX_DELETE_WORKERS)) as ex:
+            futures = {ex.submit(delete_asset, *task, repo=args.repo): task for task in tasks}
+            for fut in as_completed(futures):
+                release, asset, _ = futures[fut]
+                try:
+                    fut.result()
+                    deleted_assets.add(asset)
+                except Exception as e:
+                    print(f"Failed to delete '{asset}' from release '{release}': {e}", file=sys.stderr)
+                    failed_assets.add(asset)
 
     total_count = len(files_to_delete)
     deleted_count = len(deleted_assets)
-    skipped_count = total_count - deleted_count
+    failed_count = len(failed_assets - deleted_assets)
+    skipped_count = total_count - deleted_count - failed_count
 
     print("--- Deletion Summary ---")
     print(f"Total files requested for deletion: {total_count}")
     print(f"Successfully deleted files: {deleted_count}")
     print(f"Skipped files (not found in any release): {skipped_count}")
+    print(f"Files failed to delete: {failed_count}")
+
+    if failed_count > 0:
+        return 1
     
     return 0
 
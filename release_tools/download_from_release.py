@@ -1,14 +1,17 @@
 import argparse
 import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-from .utils import command_exists, get_asset_names, get_release_map, run_command
+from .utils import command_exists, fetch_release_map_and_assets, read_file_names, run_command, split_into_batches
 
+_DOWNLOAD_PREFIX = ('gh', 'release', 'download')
 
 def download_assets(release, assets, output_dir=None, repo=None):
     """Download a list of assets from a release."""
     print(f"Downloading {len(assets)} asset(s) from release '{release}'")
-    command = ['gh', 'release', 'download', release]
+    command = [*_DOWNLOAD_PREFIX, release]
     for asset in assets:
         command.extend(['-p', asset])
     if output_dir:
@@ -24,7 +27,8 @@ def main(argv):
     parser.add_argument('--file-list', '-f', type=Path, help='Path to a text file with a list of files to download (one file per line).')
     parser.add_argument('--output-dir', '-d', type=Path, help='The directory to save the downloaded files. If not provided, files are downloaded to the current directory.')
     parser.add_argument('--skip-existing', action='store_true', help='Skip downloading files that already exist in the output directory.')
-    parser.add_argument('--batch-size', '-b', type=int, default=1, help='The number of files to download in a single batch. (default: 50)')
+    parser.add_argument('--batch-size', '-b', type=int, default=1, help='The number of files to download in a single batch. (default: 1)')
+    parser.add_argument('--parallel', '-p', type=int, default=8, help='The number of batches to download concurrently. (default: 8)')
     parser.add_argument('files', nargs='*', help='File names to download.')
     args = parser.parse_args(argv)
 
@@ -38,24 +42,25 @@ def main(argv):
     if not args.file_list and not args.files:
         parser.error("No files to download. Please provide a file list with --file-list or specify file names as arguments.")
 
-    files_to_download = set()
-    if args.file_list:
-        if args.file_list.exists():
-            with open(args.file_list, 'r') as f:
-                files_to_download.update(line.strip() for line in f if line.strip())
-        else:
-            print(f"Error: File list '{args.file_list}' not found.", file=sys.stderr)
-            return 1
-            
-    if args.files:
-        files_to_download.update(args.files)
+    if args.file_list and not args.file_list.exists():
+        print(f"Error: File list '{args.file_list}' not found.", file=sys.stderr)
+        return 1
+
+    files_to_download = read_file_names(args.file_list, args.files)
 
     if not files_to_download:
         print("No files to download.")
         return 0
 
-    print("Getting release list")
-    release_map = get_release_map(args.release, repo=args.repo)
+    files_sorted = sorted(files_to_download)
+
+    if len(files_sorted) <= 50:
+        print(f"Files to download: {files_sorted}")
+    else:
+        print(f"Files to download: {len(files_to_download)} files")
+
+    print("Getting release list and assets")
+    release_map, release_to_assets, _ = fetch_release_map_and_assets(args.release, repo=args.repo)
     
     if not release_map:
         print("No releases found to process.", file=sys.stderr)
@@ -64,64 +69,63 @@ def main(argv):
     releases_to_process = list(release_map.values())
 
     print(f"Will process releases: {releases_to_process}")
-    print(f"Files to download: {sorted(list(files_to_download))}")
 
     asset_to_release_map = {}
-    release_to_assets_map = {}
-    for release in releases_to_process:
-        print(f"Fetching assets from release: {release}")
-        assets = get_asset_names(release, repo=args.repo)
+    for release, assets in release_to_assets.items():
         for asset in assets:
             if asset in files_to_download:
                 asset_to_release_map[asset] = release
-                release_to_assets_map.setdefault(release, []).append(asset)
 
     output_dir = args.output_dir or Path('.')
 
     downloaded_assets = set()
-    skipped_assets = set()
+    skipped_assets = []
+    not_found_assets = []
     failed_assets = set()
 
-    for asset in asset_to_release_map.keys():
-        output_file = output_dir / asset
-        if args.skip_existing and output_file.exists():
-            skipped_assets.add(asset)
+    # walking the sorted names once keeps every per-release list in sorted order
+    release_to_assets_map = defaultdict(list)
+    for asset in files_sorted:
+        release = asset_to_release_map.get(asset)
+        if release is None:
+            not_found_assets.append(asset)
+        elif args.skip_existing and (output_dir / asset).exists():
+            skipped_assets.append(asset)
+        else:
+            release_to_assets_map[release].append(asset)
 
     skipped_count = len(skipped_assets)
     if skipped_count > 0:
-        print(f"Skipping {skipped_count} files that already exist: {', '.join(list(skipped_assets)[:5])}{'...' if skipped_count > 5 else ''}")
+        print(f"Skipping {skipped_count} files that already exist: {', '.join(skipped_assets[:5])}{'...' if skipped_count > 5 else ''}")
 
-
-    found_assets = set(asset_to_release_map.keys())
-    not_found_assets = files_to_download - found_assets
-    
-    for asset in sorted(list(not_found_assets)):
+    for asset in not_found_assets:
         print(f"Asset '{asset}' not found in any of the releases.", file=sys.stderr)
 
     to_download_count = len(files_to_download) - len(skipped_assets) - len(not_found_assets)
 
-    for release, assets in release_to_assets_map.items():
-        assets_to_download_for_release = []
-        for asset in sorted(assets):
-            if asset not in skipped_assets:
-                assets_to_download_for_release.append(asset)
-
-        if not assets_to_download_for_release:
-            continue
-
-        batch_size = args.batch_size
-        for i in range(0, len(assets_to_download_for_release), batch_size):
-            batch = assets_to_download_for_release[i:i+batch_size]
-            try:
-                download_assets(release, batch, args.output_dir, repo=args.repo)
-                downloaded_assets.update(batch)
-                print(f"Downloaded {len(downloaded_assets)} of {to_download_count} files...")
-            except Exception as e:
-                print(f"Failed to download a batch of {len(batch)} files from {release}: {e}", file=sys.stderr)
-                for asset in batch:
-                    output_file = output_dir / asset
-                    if not output_file.exists():
-                        failed_assets.add(asset)
+    batches = []
+    for release, assets_to_download_for_release in release_to_assets_map.items():
+        for batch in split_into_batches(assets_to_download_for_release, args.batch_size):
+            batches.append((release, batch))
+
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(len(batches), max(args.parallel, 1))) as ex:
+            futures = {
+                ex.submit(download_assets, release, batch, args.output_dir, repo=args.repo): (release, batch)
+                for release, batch in batches
+            }
+            for fut in as_completed(futures):
+                release, batch = futures[fut]
+                try:
+                    fut.result()
+                    downloaded_assets.update(batch)
+                    print(f"Downloaded {len(downloaded_assets)} of {to_download_count} files...")
+                except Exception as e:
+                    print(f"Failed to download a batch of {len(batch)} files from {release}: {e}", file=sys.stderr)
+                    for asset in batch:
+                        output_file = output_dir / asset
+                        if not output_file.exists():
+                            failed_assets.add(asset)
 
     total_count = len(files_to_download)
     downloaded_count = len(downloaded_assets)
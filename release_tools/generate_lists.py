@@ -3,22 +3,16 @@ import csv
 import sys
 from pathlib import Path
 
-from .utils import command_exists, get_release_map, run_command
-
-def get_assets(release, ext, repo=None):
-    """Get all assets with a given extension for a given release."""
-    output = run_command([
-        'gh',
-        'release',
-        'view',
-        release,
-        '--json',
-        'assets',
-        '-q',
-        f'.assets[] | select(.name | endswith("{ext}")) | "\\(.name),\\(.size),\\(.url)"'
-    ], repo=repo)
-    return output.strip()
+from .utils import command_exists, fetch_release_map_and_assets, get_release_assets_json, run_command
 
+def get_assets(release, extensions, repo=None, release_id=None):
+    """Get (name, size, url) rows for all assets with any of the given extensions for a given release."""
+    extensions = tuple(extensions)
+    return [
+        (a['name'], a['size'], a['browser_download_url'])
+        for a in get_release_assets_json(release, repo=repo, release_id=release_id)
+        if a['name'].endswith(extensions)
+    ]
 
 def cli():
     """Main function to generate file lists and upload to release."""
@@ -36,24 +30,23 @@ def cli():
         print("No file extensions provided. Please specify at least one extension using --extension.", file=sys.stderr)
         return 1
 
+    def fetch(release, repo=None, release_id=None):
+        print(f"Processing release: {release}")
+        return get_assets(release, args.extension, repo=repo, release_id=release_id)
+
     print("Getting file list")
-    release_map = get_release_map(args.release, repo=args.repo)
+    release_map, release_to_assets, _ = fetch_release_map_and_assets(args.release, repo=args.repo, fetch=fetch)
     releases_to_process = list(release_map.values())
     
     if not releases_to_process:
         print("No releases found to process.", file=sys.stderr)
         return 1
 
-    print(f"Will process releases: {releases_to_process}")
+    print(f"Processed releases: {releases_to_process}")
 
     all_assets = []
-    for release in releases_to_process:
-        print(f"Processing release: {release}")
-        for ext in args.extension:
-            assets = get_assets(release, ext, repo=args.repo)
-            if assets:
-                # Filter out empty strings that can result from split('\n')
-                all_assets.extend([line.strip() for line in assets.split('\n') if line.strip()])
+    for rows in release_to_assets.values():
+        all_assets.extend(rows)
 
     if not all_assets:
         print("No assets found to process.")
@@ -64,8 +57,7 @@ def cli():
     with open(csv_file, 'w') as csvfile:
         csv_writer = csv.writer(csvfile)
         csv_writer.writerow(['name', 'size', 'url'])
-        for asset_line in all_assets:
-            csv_writer.writerow(asset_line.split(',', 2))
+        csv_writer.writerows(all_assets)
 
     print(f"Uploading {csv_file} to release {args.release}")
     run_command(['gh', 'release', 'upload', args.release, str(csv_file), '--clobber'], repo=args.repo)
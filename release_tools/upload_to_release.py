@@ -1,74 +1,107 @@
 import argparse
+import functools
+import os
 import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-from .utils import command_exists, get_release_map, get_asset_names, get_repo_name_from_gh, run_command
+from .utils import (
+    command_exists,
+    fetch_release_map_and_assets,
+    get_release_json,
+    get_repo_name_from_gh,
+    run_command,
+    split_into_batches,
+)
 
 class CliError(Exception):
     pass
 
 FIRST_RELEASE_MAX_ASSETS = 988
 OTHER_RELEASE_MAX_ASSETS = 998
+# GitHub rejects release assets of 2 GiB or more
+MAX_ASSET_SIZE = 2 * 1024 ** 3
+
+_UPLOAD_PREFIX = ("gh", "release", "upload")
 
 class ReleaseMapper:
+    # release tags are interned, so the many lookups and comparisons against them
+    # mostly short-circuit on identity
     def __init__(self, main_tag):
         self.release_to_assets = {}
-        self.main_tag = main_tag
+        self.main_tag = sys.intern(main_tag)
         self.assets_to_releases = {}
+        # releases that still have room, kept up to date on every change; a dict keeps insertion order
+        self._available = {}
+
+    def _max_assets(self, release):
+        return FIRST_RELEASE_MAX_ASSETS if release == self.main_tag else OTHER_RELEASE_MAX_ASSETS
 
     def add_release(self, release):
+        release = sys.intern(release)
         if release not in self.release_to_assets:
             self.release_to_assets[release] = set()
+            self._available[release] = None
 
     def add_asset(self, asset, release):
-        if release not in self.release_to_assets:
-            self.release_to_assets[release] = set()
+        release = sys.intern(release)
+        self.add_release(release)
 
-        self.release_to_assets[release].add(asset)
+        assets = self.release_to_assets[release]
+        assets.add(asset)
+        if len(assets) >= self._max_assets(release):
+            self._available.pop(release, None)
 
         self.assets_to_releases[asset] = release
 
-    def get_available_releases(self):
-        available_releases = []
-
-        for release, assets in self.release_to_assets.items():
-            max_assets = FIRST_RELEASE_MAX_ASSETS if release == self.main_tag else OTHER_RELEASE_MAX_ASSETS
-
-            count = len(assets)
-            if count < max_assets:
-                available_releases.append(release)
+    def bulk_load(self, release_to_assets):
+        """Load the existing assets of several releases at once."""
+        release_to_assets = {sys.intern(release): assets for release, assets in release_to_assets.items()}
+        for release, assets in release_to_assets.items():
+            self.release_to_assets.setdefault(release, set()).update(assets)
+        self.assets_to_releases.update(
+            {asset: release for release, assets in release_to_assets.items() for asset in assets}
+        )
+        self._available = {
+            release: None for release, assets in self.release_to_assets.items()
+            if len(assets) < self._max_assets(release)
+        }
 
-        return available_releases
+    def get_upload_target(self):
+        """Get the first release that still has room, or None if all are full."""
+        return next(iter(self._available), None)
 
-    def get_release_for_asset(self, asset):
-        if asset in self.assets_to_releases:
-            return self.assets_to_releases[asset]
-        return None
+class FreeNumAllocator:
+    """Hands out the smallest unused '-extra<num>' suffix number."""
 
-def get_next_num(release_map):
-    nums = sorted(release_map.keys())
+    def __init__(self, used_nums):
+        self.used = set(used_nums)
+        self.next_candidate = 1
 
-    for n in nums:
-        if n + 1 not in nums:
-            return n + 1
+    def allocate(self):
+        # numbers are never given back, so everything below next_candidate stays taken
+        while self.next_candidate in self.used:
+            self.next_candidate += 1
 
-    return nums[-1] + 1
+        num = self.next_candidate
+        self.used.add(num)
+        self.next_candidate += 1
+        return num
 
 
 
-def get_release_title(tag, repo=None):
+@functools.cache
+def get_release_title(tag, repo=None, release_id=None):
     try:
-        cmd = ["gh", "release", "view", tag, "--json", "name", "-q", ".name"]
-        result = run_command(cmd, repo=repo)
-        return result.strip()
+        # untitled releases have a null name, which gh used to print as an empty string
+        return get_release_json(tag, repo=repo, release_id=release_id)['name'] or ''
     except Exception as e:
         raise CliError(f"Error getting release title for tag {tag}: {e}")
 
-def create_release(next_num, main_tag, repo=None):
+def create_release(next_num, main_tag, repo_name, main_release_title, repo=None):
     new_release = f"{main_tag}-extra{next_num}"
     print(f"Creating new release '{new_release}'...")
-    repo_name = get_repo_name_from_gh(repo)
-    main_release_title = get_release_title(main_tag, repo=repo)
     main_release_url = f"https://github.com/{repo_name}/releases/tag/{main_tag}"
 
     new_release_title = f"{main_release_title} Supplementary{next_num}"
@@ -85,8 +118,7 @@ def create_release(next_num, main_tag, repo=None):
 
 def upload_assets(release, file_paths, clobber=False, repo=None):
     """Upload a list of assets to a release."""
-    command = ["gh", "release", "upload", release]
-    command.extend([str(p) for p in file_paths])
+    command = [*_UPLOAD_PREFIX, release, *map(str, file_paths)]
 
     if clobber:
         command.append("--clobber")
@@ -115,7 +147,8 @@ def cli():
             action="store_true",
             help="Allow overwriting existing assets.",
         )
-        parser.add_argument('--batch-size', '-b', type=int, default=1, help='The number of files to upload in a single batch. (default: 50)')
+        parser.add_argument('--batch-size', '-b', type=int, default=1, help='The number of files to upload in a single batch. (default: 1)')
+        parser.add_argument('--parallel', '-p', type=int, default=8, help='The number of batches to upload concurrently. (default: 8)')
         args = parser.parse_args()
 
         if not command_exists("gh"):
@@ -126,7 +159,7 @@ def cli():
 
         print(f"Fetching existing assets for releases matching pattern '{args.release}(-extra[0-9]+)?'...")
 
-        release_map = get_release_map(args.release, repo=args.repo)
+        release_map, release_to_assets, release_ids = fetch_release_map_and_assets(args.release, repo=args.repo)
         releases_to_process = list(release_map.values())
 
         if not releases_to_process:
@@ -139,39 +172,44 @@ def cli():
 
         release_mapper = ReleaseMapper(args.release)
 
-        for rel in releases_to_process:
-            release_mapper.add_release(rel)
-            print(f"Fetching assets from release: {rel}")
-            assets = get_asset_names(rel, repo=args.repo)
-            for asset in assets:
-                release_mapper.add_asset(asset, rel)
+        release_mapper.bulk_load(release_to_assets)
 
         print(f"Starting upload process from folder '{args.folder}'...")
 
-        files_to_upload_paths = []
-        for ext in args.extension or []:
-            files_to_upload_paths += sorted(list(args.folder.glob(f"*{ext}")))
+        extensions = tuple(args.extension or ())
+        # the sizes come from the same scan, so oversized files are caught without another stat per file
+        with os.scandir(args.folder) as entries:
+            file_sizes = {
+                entry.name: entry.stat().st_size for entry in entries
+                if entry.is_file() and entry.name.endswith(extensions)
+            }
+        files_to_upload_paths = [args.folder / name for name in sorted(file_sizes)]
 
         total_files = len(files_to_upload_paths)
         
         files_to_skip = []
-        files_to_overwrite = {}  # release -> list of file_paths
+        files_to_overwrite = defaultdict(list)  # release -> list of file_paths
         files_for_new_upload = []
+        files_too_large = []
 
+        # looked up once per file, so skip the method call and attribute lookup
+        assets_to_releases = release_mapper.assets_to_releases
         for file_path in files_to_upload_paths:
             filename = file_path.name
-            release = release_mapper.get_release_for_asset(filename)
-
-            if release:
-                if args.overwrite:
-                    files_to_overwrite.setdefault(release, []).append(file_path)
-                else:
-                    files_to_skip.append(file_path)
+            release = assets_to_releases.get(filename)
+
+            if release and not args.overwrite:
+                files_to_skip.append(file_path)
+            elif file_sizes[filename] >= MAX_ASSET_SIZE:
+                # fail fast instead of letting gh find out partway through the upload
+                files_too_large.append(file_path)
+            elif release:
+                files_to_overwrite[release].append(file_path)
             else:
                 files_for_new_upload.append(file_path)
         
         skipped_count = len(files_to_skip)
-        upload_count_target = total_files - skipped_count
+        upload_count_target = total_files - skipped_count - len(files_too_large)
         if skipped_count > 0:
             skipped_filenames = [f.name for f in files_to_skip]
             print(f"Skipping {skipped_count} files that already exist: {', '.join(skipped_filenames[:5])}{'...' if skipped_count > 5 else ''}")
@@ -180,55 +218,72 @@ def cli():
         failed_uploads = set()
         newly_uploaded_assets = set()
 
+        for file_path in files_too_large:
+            print(f"Error: '{file_path.name}' is too large to upload, release assets must be smaller than 2 GiB. Skipping.", file=sys.stderr)
+            failed_uploads.add(file_path.name)
+
+        # (release, batch, clobber) for every upload; each batch targets a fixed release,
+        # so the batches are independent of each other and can run concurrently
+        upload_batches = []
+
         for release, file_paths in files_to_overwrite.items():
             print(f"Overwriting {len(file_paths)} files in release '{release}'...")
-            batch_size = args.batch_size
-            for i in range(0, len(file_paths), batch_size):
-                batch = file_paths[i:i + batch_size]
-                try:
-                    upload_assets(release, batch, clobber=True, repo=args.repo)
-                    overwritten_assets.update(p.name for p in batch)
-                    uploaded_count = len(overwritten_assets) + len(newly_uploaded_assets)
-                    print(f"Uploaded {uploaded_count} of {upload_count_target} files...")
-                except Exception:
-                    failed_uploads.update(p.name for p in batch)
+            for batch in split_into_batches(file_paths, args.batch_size):
+                upload_batches.append((release, batch, True))
         
-        uploads_by_release = {}
+        uploads_by_release = defaultdict(list)
+        num_allocator = FreeNumAllocator(release_map.keys())
+        # looked up when the first supplementary release is created, then reused
+        repo_name = None
+        main_release_title = None
         
         print(f"Processing {len(files_for_new_upload)} new files to upload...")
+        new_count = len(files_for_new_upload)
         for i, file_path in enumerate(files_for_new_upload, 1):
             filename = file_path.name
-            print(f"[{i}/{len(files_for_new_upload)}] Assigning release for: {filename}")
-            available_releases = release_mapper.get_available_releases()
+            # per-file lines flood the output on large uploads, so only report every 100 files
+            if i % 100 == 0 or i == new_count:
+                print(f"[{i}/{new_count}] Assigning releases for new files...")
+            upload_target = release_mapper.get_upload_target()
 
-            if not available_releases:
+            if upload_target is None:
                 if args.create_extra_releases:
-                    next_num = get_next_num(release_map)
-                    new_release = create_release(next_num, args.release, repo=args.repo)
+                    next_num = num_allocator.allocate()
+                    if main_release_title is None:
+                        repo_name = get_repo_name_from_gh(args.repo)
+                        main_release_title = get_release_title(args.release, repo=args.repo, release_id=release_ids[args.release])
+                    new_release = create_release(next_num, args.release, repo_name, main_release_title, repo=args.repo)
                     release_mapper.add_release(new_release)
-                    available_releases.append(new_release)
+                    upload_target = new_release
                     release_map[next_num] = new_release
                 else:
                     print(f"Error: All existing releases are full. No space to upload '{filename}'. Skipping.", file=sys.stderr)
                     failed_uploads.add(filename)
                     continue
 
-            upload_target = available_releases[0]
-            uploads_by_release.setdefault(upload_target, []).append(file_path)
+            uploads_by_release[upload_target].append(file_path)
             release_mapper.add_asset(filename, upload_target)
 
         for release, file_paths in uploads_by_release.items():
-            batch_size = args.batch_size
-            for i in range(0, len(file_paths), batch_size):
-                batch = file_paths[i:i + batch_size]
-                try:
-                    upload_assets(release, batch, repo=args.repo)
-                    newly_uploaded_assets.update(p.name for p in batch)
-                    uploaded_count = len(overwritten_assets) + len(newly_uploaded_assets)
-                    print(f"Uploaded {uploaded_count} of {upload_count_target} files...")
-                except Exception:
-                    failed_uploads.update(p.name for p in batch)
-
+            for batch in split_into_batches(file_paths, args.batch_size):
+                upload_batches.append((release, batch, False))
+
+        if upload_batches:
+            with ThreadPoolExecutor(max_workers=min(len(upload_batches), max(args.parallel, 1))) as ex:
+                futures = {
+                    ex.submit(upload_assets, release, batch, clobber=clobber, repo=args.repo): (batch, clobber)
+                    for release, batch, clobber in upload_batches
+                }
+                for fut in as_completed(futures):
+                    batch, clobber = futures[fut]
+                    try:
+                        fut.result()
+                        uploaded = overwritten_assets if clobber else newly_uploaded_assets
+                        uploaded.update(p.name for p in batch)
+                        uploaded_count = len(overwritten_assets) + len(newly_uploaded_assets)
+                        print(f"Uploaded {uploaded_count} of {upload_count_target} files...")
+                    except Exception:
+                        failed_uploads.update(p.name for p in batch)
 
         print("Upload process complete.")
         print()
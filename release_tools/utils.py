@@ -1,8 +1,22 @@
+import functools
+import hashlib
+import json
+import os
 import re
+import shutil
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import quote
 
+MAX_FETCH_WORKERS = 8
+
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'release_tools'
+
+@functools.cache
 def command_exists(cmd):
-    return subprocess.run(f"command -v {cmd}", shell=True, capture_output=True, text=True).returncode == 0
+    return shutil.which(cmd) is not None
 
 def run_command(cmd, repo=None):
     """Run a shell command and return its output."""
@@ -21,55 +35,233 @@ def run_command(cmd, repo=None):
         print(e.stdout)
         raise Exception(f"Command '{' '.join(cmd)}' failed with exit code {e.returncode}")
 
-def get_release_map(tag, repo=None):
-    output = run_command(["gh", "release", "list", "--json", "tagName", "-q", ".[].tagName", '-L', '500'], repo=repo)
+def run_command_stream(cmd, repo=None):
+    """Run a shell command and yield its output line by line as it is produced."""
+    if repo and cmd[0] == 'gh':
+        cmd = ['gh', '-R', repo] + cmd[1:]
+
+    print(f"Running command: {' '.join(cmd)}")
+    # stderr goes to a file rather than a pipe, so a chatty command can't block on a full
+    # stderr pipe while we are still reading stdout
+    with tempfile.TemporaryFile(mode='w+') as stderr_file:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, text=True, bufsize=1) as proc:
+            for line in proc.stdout:
+                line = line.strip()
+                if line:
+                    yield line
+            returncode = proc.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+
+    if returncode != 0:
+        print(f"Error running command '{' '.join(cmd)}'")
+        print('command output stderr:')
+        print(stderr)
+        raise Exception(f"Command '{' '.join(cmd)}' failed with exit code {returncode}")
+
+def read_file_names(file_list=None, files=None):
+    """Collect file names from a text file (one per line) and from a list of names."""
+    names = set()
+    if file_list:
+        with open(file_list, 'r') as f:
+            names.update(map(str.strip, f))
+        names.discard('')
+    if files:
+        names.update(files)
+    return names
+
+def split_into_batches(items, batch_size):
+    """Split items into batches of batch_size."""
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+def _read_cache(cache_file):
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # anything that isn't a complete entry is treated as a miss
+    if not isinstance(cached, dict) or 'etag' not in cached or 'body' not in cached:
+        return None
+    return cached
 
-    all_releases = output.strip().split('\n')
-    pattern = re.compile(f"^{re.escape(tag)}(-extra(?P<num>[0-9]+))?$")
+def _write_cache(cache_file, etag, body):
+    tmp_file = None
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # a uniquely named temp file per writer, as the fetch pools write from several threads
+        with tempfile.NamedTemporaryFile('w', dir=cache_file.parent, suffix='.tmp', delete=False) as f:
+            tmp_file = f.name
+            json.dump({'etag': etag, 'body': body}, f)
+        os.replace(tmp_file, cache_file)
+        tmp_file = None
+    except OSError as e:
+        print(f"Warning: could not write cache file '{cache_file}': {e}")
+    finally:
+        # don't leave a partial temp file behind when the write or the rename failed
+        if tmp_file is not None:
+            try:
+                os.unlink(tmp_file)
+            except OSError:
+                pass
+
+def _cached_get(endpoint):
+    """GET a `gh api` endpoint, revalidating a locally cached response with its ETag.
+
+    A `304 Not Modified` answer returns the cached body and does not count against the rate limit.
+    """
+    cache_file = CACHE_DIR / f"{hashlib.sha1(endpoint.encode()).hexdigest()}.json"
+    cached = _read_cache(cache_file)
+
+    cmd = ['gh', 'api', '-i', endpoint]
+    if cached:
+        cmd.extend(['-H', f"If-None-Match: {cached['etag']}"])
+
+    print(f"Running command: {' '.join(cmd)}")
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    # `gh api -i` prints the status line and the headers, then a blank line, then the body
+    head, *rest = re.split(r'\r?\n\r?\n', result.stdout, maxsplit=1)
+    body = rest[0] if rest else ''
+    status_line, *header_lines = head.splitlines() or ['']
+    status_parts = status_line.split()
+    status = status_parts[1] if len(status_parts) > 1 else None
+
+    if status == '304' and cached:
+        return cached['body']
+
+    if result.returncode != 0:
+        print(f"Error running command '{' '.join(cmd)}'")
+        print('command output stderr:')
+        print(result.stderr)
+        print('command output stdout:')
+        print(result.stdout)
+        raise Exception(f"Command '{' '.join(cmd)}' failed with exit code {result.returncode}")
 
-    rel_map = {}
-    for r in all_releases:
-        match = pattern.match(r)
+    etag = None
+    for line in header_lines:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'etag':
+            etag = value.strip()
+
+    body = body.strip()
+    if etag:
+        _write_cache(cache_file, etag, body)
+    return body
+
+# only the tag and id of each release; the REST listing would also send the full asset list
+# of every release in the repo
+_RELEASES_QUERY = """
+query($owner: String!, $name: String!, $endCursor: String) {
+  repository(owner: $owner, name: $name) {
+    releases(first: 100, after: $endCursor, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes { tagName databaseId }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+"""
+
+@functools.cache
+def _release_pattern(tag):
+    """Compiled pattern matching a release tag and its '-extra<num>' releases."""
+    return re.compile(f"{re.escape(tag)}(-extra(?P<num>[0-9]+))?")
+
+def iter_release_map(tag, repo=None):
+    """Yield (num, release, release_id) for the main release and its '-extra<num>' releases as they are listed."""
+    fullmatch = _release_pattern(tag).fullmatch
+
+    # the listing is paginated, so unlike `gh release list -L 500` it is never truncated;
+    # gh prints each page as it arrives, so releases are yielded before the listing finishes
+    repo_name = get_repo_name_from_gh(repo)
+    owner, name = repo_name.split('/', 1)
+    all_releases = run_command_stream([
+        'gh',
+        'api',
+        'graphql',
+        '--paginate',
+        '-f', f"query={_RELEASES_QUERY}",
+        '-f', f"owner={owner}",
+        '-f', f"name={name}",
+        '--jq',
+        '.data.repository.releases.nodes[] | "\\(.databaseId) \\(.tagName)"'
+    ])
+
+    for line in all_releases:
+        release_id, _, r = line.partition(' ')
+        match = fullmatch(r)
         if match is None:
             continue
-        g = match.groupdict()
-        num = g.get('num')
-        if num is not None:
-            num = int(num)
-            if num == 0:
-                raise Exception("Release cannot have '-extra0' suffix")
-        else:
-            num = 0
-
-        rel_map[num] = r
+        num = int(match['num']) if match['num'] else 0
+        if num == 0 and match['num']:
+            raise Exception("Release cannot have '-extra0' suffix")
 
-    return rel_map
+        yield num, r, release_id
 
+@functools.cache
 def get_repo_name_from_gh(repo=None):
     if repo:
         return repo
     try:
-        result = run_command(
-            ["gh", "repo", "view", "--json", "nameWithOwner", "-q", ".nameWithOwner"], repo=repo
-        )
-        return result.strip()
+        result = run_command(["gh", "repo", "view", "--json", "nameWithOwner"], repo=repo)
+        return json.loads(result)['nameWithOwner']
     except Exception as e:
         raise Exception(f"Error getting repository name: {e}")
 
-def get_asset_names(release, repo=None):
+def get_release_json(release, repo=None, release_id=None):
+    """Get the release metadata, including all its assets, with a single API call.
+
+    Draft releases can only be fetched by `release_id`, the tags endpoint returns 404 for them.
+    """
+    repo_name = get_repo_name_from_gh(repo)
+    if release_id is not None:
+        endpoint = f"repos/{repo_name}/releases/{release_id}"
+    else:
+        endpoint = f"repos/{repo_name}/releases/tags/{quote(release, safe='')}"
+    return json.loads(_cached_get(endpoint))
+
+def get_release_assets_json(release, repo=None, release_id=None):
+    """Get the asset entries of a given release as returned by the GitHub API."""
+    return get_release_json(release, repo=repo, release_id=release_id)['assets']
+
+def get_asset_names(release, repo=None, release_id=None):
     """Get all asset names for a given release."""
-    output = run_command([
-        'gh',
-        'release',
-        'view',
-        release,
-        '--json',
-        'assets',
-        '-q',
-        '.assets[].name'
-    ], repo=repo)
-    output = output.strip()
-    if not output:
-        return []
-
-    return output.split('\n')
+    return [asset['name'] for asset in get_release_assets_json(release, repo=repo, release_id=release_id)]
+
+def fetch_all_assets(releases, repo=None, fetch=None):
+    """Fetch assets for all given releases concurrently.
+
+    `releases` can be any iterable of (release, release_id); each fetch is submitted as soon as
+    its release is produced.
+    Returns a dict of release -> result of `fetch(release, repo=repo, release_id=release_id)`,
+    in the same order as `releases`.
+    """
+    if fetch is None:
+        fetch = get_asset_names
+
+    futures = {}
+    with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as ex:
+        for release, release_id in releases:
+            futures[ex.submit(fetch, release, repo=repo, release_id=release_id)] = release
+        results = {futures[fut]: fut.result() for fut in as_completed(futures)}
+
+    return {release: results[release] for release in futures.values()}
+
+def fetch_release_map_and_assets(tag, repo=None, fetch=None):
+    """Get the release map for a tag along with the assets of each of its releases.
+
+    Fetching the assets of a release starts as soon as it shows up in the release listing.
+    Returns (release_map, release_to_assets, release_ids): a dict of num -> release,
+    the assets as from `fetch_all_assets` and a dict of release -> release id.
+    """
+    release_map = {}
+    release_ids = {}
+
+    def releases():
+        for num, release, release_id in iter_release_map(tag, repo=repo):
+            release_map[num] = release
+            release_ids[release] = release_id
+            yield release, release_id
+
+    release_to_assets = fetch_all_assets(releases(), repo=repo, fetch=fetch)
+    return release_map, release_to_assets, release_ids